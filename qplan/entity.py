@@ -3,13 +3,17 @@
 #
 #  E. Jeschke
 #
-from datetime import timedelta, datetime
+from datetime import timedelta, datetime, timezone
+import sys
+import re
 import math
+import bisect
+import functools
+import operator
+import copy
 import dateutil.parser
-from dateutil import tz
 
 # 3rd party imports
-import numpy as np
 from astropy.coordinates import Angle
 from astropy import units
 
@@ -28,16 +32,86 @@ NOTES
 
 """
 
+# MongoDB returns naive UTC datetimes; see NOTES [1]
+# (the stdlib UTC singleton is implemented in C, unlike dateutil's)
+_UTC = timezone.utc
+
+def _db_time(dt):
+    """Reattach the UTC time zone to a naive datetime from the database."""
+    if dt is None or dt.tzinfo is not None:
+        return dt
+    return dt.replace(tzinfo=_UTC)
+
+# Spreadsheet values accepted as "yes" for boolean columns
+_YES = frozenset(['y', 'Y', 'yes', 'YES'])
+
 def explode(item):
     return {key: val
             for key, val in item.__dict__.items()
-            if not key.startswith('_')}
+            if key[:1] != '_'}
+
+def _equivalent(a, b):
+    """
+    equivalent() for component objects, which are often shared between
+    OBs (so the same object) or may be missing (None).
+    """
+    if a is b:
+        return True
+    if a is None or b is None:
+        return False
+    return a.equivalent(b)
+
+def _strip(val):
+    """Strip a string field of a record.  A missing (None) value is ''."""
+    if val is None:
+        return ''
+    return val.strip()
+
+# Interned lower/upper-cased versions of strings seen by _lower()/_upper().
+# These are only used for fields with a small set of values (filters,
+# domes, instruments, ...) so they stay small.
+_lower_cache = {}
+_upper_cache = {}
+
+def _lower(val):
+    """Lower-case and intern a string field.  None stays None."""
+    if val is None:
+        return None
+    res = _lower_cache.get(val, None)
+    if res is None:
+        res = sys.intern(val.lower())
+        _lower_cache[val] = res
+    return res
+
+def _upper(val):
+    """Upper-case and intern a string field.  None stays None."""
+    if val is None:
+        return None
+    res = _upper_cache.get(val, None)
+    if res is None:
+        res = sys.intern(val.upper())
+        _upper_cache[val] = res
+    return res
+
+def _intern(val):
+    """Intern a string field with a small set of values.  None stays None."""
+    if val is None:
+        return None
+    return sys.intern(val)
+
+def _close(a, b, rtol=1e-05, atol=1e-08):
+    """
+    Scalar version of numpy.isclose(a, b), with the same default tolerances.
+    None is only close to None.
+    """
+    if a is None or b is None:
+        return a is b
+    return a == b or abs(a - b) <= atol + rtol * abs(b)
 
 
 class PersistentEntity(object):
 
     def __init__(self, tblname):
-        super().__init__()
         self._tblname = tblname
 
     def to_rec(self):
@@ -73,8 +147,9 @@ class Program(PersistentEntity):
         self.qc_priority = qc_priority
         self.grade = grade
         self.partner = partner
-        self.category = category.lower()
-        self.instruments = [str.upper(s) for s in instruments]
+        self.category = _lower(category)
+        self.instruments = tuple(_upper(s) for s in instruments)
+        self._instruments_fs = frozenset(self.instruments)
         self.total_time = hours * 3600.0
         # TODO: eventually this will contain all the relevant info
         # pertaining to a proposal
@@ -84,35 +159,28 @@ class Program(PersistentEntity):
     def key(self):
         return dict(proposal=self.proposal)
 
+    def from_rec(self, doc):
+        super().from_rec(doc)
+
+        self._instruments_fs = frozenset(self.instruments)
+
     def __repr__(self):
         return self.proposal
 
     __str__ = __repr__
 
+    # fields compared exactly by equivalent()
+    _exact_fields = operator.attrgetter('proposal', 'propid', 'pi',
+                                        'observers', 'grade', 'partner',
+                                        'category', '_instruments_fs')
+
     def equivalent(self, other):
-        if self.proposal != other.proposal:
-            return False
-        if self.propid != other.propid:
-            return False
-        if self.pi != other.pi:
-            return False
-        if self.observers != other.observers:
-            return False
-        if not np.isclose(self.rank, other.rank):
-            return False
-        if not np.isclose(self.qc_priority, other.qc_priority):
-            return False
-        if self.grade != other.grade:
-            return False
-        if self.partner != other.partner:
-            return False
-        if self.category != other.category:
-            return False
-        if not np.isclose(self.rank, other.rank):
-            return False
-        if set(self.instruments) != set(other.instruments):
-            return False
-        return True
+        if self is other:
+            return True
+        # exact compares first, float compares last
+        return (self._exact_fields(self) == self._exact_fields(other) and
+                _close(self.rank, other.rank) and
+                _close(self.qc_priority, other.qc_priority))
 
 
 class Intensive_Program(PersistentEntity):
@@ -138,14 +206,14 @@ class Intensive_Program(PersistentEntity):
 
     __str__ = __repr__
 
+    # fields compared by equivalent()
+    _exact_fields = operator.attrgetter('proposal', 'total_hours',
+                                        'semester_hours')
+
     def equivalent(self, other):
-        if self.proposal != other.proposal:
-            return False
-        if self.total_hours != other.total_hours:
-            return False
-        if self.semester_hours != other.semester_hours:
-            return False
-        return True
+        if self is other:
+            return True
+        return self._exact_fields(self) == self._exact_fields(other)
 
 
 class SlotError(Exception):
@@ -156,9 +224,9 @@ class Slot(object):
     Slot -- a period of the night that can be scheduled.
     Defined by a start time and a duration in seconds.
     """
+    __slots__ = ('start_time', 'stop_time', 'data', 'ob')
 
     def __init__(self, start_time, slot_len_sec, data=None):
-        super().__init__()
         self.start_time = start_time
         self.stop_time = start_time + timedelta(seconds=slot_len_sec)
         self.data = data
@@ -183,37 +251,38 @@ class Slot(object):
           Depending on the overlap, there will be 1, 2 or 3 slots in the
           return list.
         """
-        if start_time < self.start_time:
-            diff = (start_time - self.start_time).total_seconds()
-            if math.fabs(diff) < 5.0:
+        # length of time before the split
+        head = (start_time - self.start_time).total_seconds()
+        if head < 0.0:
+            if head > -5.0:
                 start_time = self.start_time
+                head = 0.0
             else:
                 raise SlotError("Start time (%s) < slot start time (%s) diff=%f" % (
-                    start_time, self.start_time, diff))
+                    start_time, self.start_time, head))
 
         stop_time = start_time + timedelta(seconds=slot_len_sec)
         if stop_time > self.stop_time:
             raise SlotError("Stop time (%s) > slot stop time (%s)" % (
                 stop_time, self.stop_time))
 
+        # length of time after the inserted slot
+        tail = (self.stop_time - stop_time).total_seconds()
+
         # define before slot
         slot_b = None
-        diff = (start_time - self.start_time).total_seconds()
         # Don't create a slot for less than a minute in length
-        if diff > 1.0:
-            diff_sec = (start_time - self.start_time).total_seconds()
-            slot_b = Slot(self.start_time, diff_sec, data=self.data)
+        if head > 1.0:
+            slot_b = Slot(self.start_time, head, data=self.data)
 
         # define new displacing slot
         slot_c = Slot(start_time, slot_len_sec, data=self.data)
 
         # define after slot
         slot_d = None
-        diff = (self.stop_time - stop_time).total_seconds()
         # Don't create a slot for less than a minute in length
-        if diff > 1.0:
-            diff_sec = (self.stop_time - stop_time).total_seconds()
-            slot_d = Slot(stop_time, diff_sec, data=self.data)
+        if tail > 1.0:
+            slot_d = Slot(stop_time, tail, data=self.data)
 
         return (slot_b, slot_c, slot_d)
 
@@ -243,8 +312,10 @@ class Schedule(object):
     Defines a series of slots and operations on that series.
 
     """
+    __slots__ = ('start_time', 'stop_time', 'data', 'waste', 'slots',
+                 '_starts')
+
     def __init__(self, start_time, stop_time, data=None):
-        super().__init__()
         self.start_time = start_time
         self.stop_time = stop_time
         self.data = data
@@ -252,6 +323,9 @@ class Schedule(object):
         diff = (self.stop_time - self.start_time).total_seconds()
         self.waste = diff
         self.slots = []
+        # start times of self.slots, in the same order, so that
+        # neighbouring slots can be found by bisection
+        self._starts = []
 
     def num_slots(self):
         return len(self.slots)
@@ -271,31 +345,29 @@ class Schedule(object):
         return Slot(start_time, diff)
 
     def _previous(self, slot):
-        if len(self.slots) == 0:
+        starts = self._starts
+        # slots are mostly inserted in time order, so check the end first
+        if len(starts) > 0 and starts[-1] <= slot.start_time:
+            i = len(starts) - 1
+            return i, self.slots[i]
+
+        i = bisect.bisect_right(starts, slot.start_time) - 1
+        if i < 0:
             return -1, None
-
-        # TODO: in the typical insertion case, would the search
-        # be faster from the rear?
-        for i in range(len(self.slots)):
-            slot_i = self.slots[i]
-            if slot_i.start_time > slot.start_time:
-                if i == 0:
-                    return -1, None
-                return i-1, self.slots[i-1]
-
-        return i, slot_i
+        return i, self.slots[i]
 
     def get_previous(self, slot):
         i, slot_i = self._previous(slot)
         return slot_i
 
     def _next(self, slot):
-        for i in range(len(self.slots)):
-            slot_i = self.slots[i]
-            if slot_i.start_time > slot.start_time:
-                return i, slot_i
+        starts = self._starts
+        # slots are mostly inserted in time order, so check the end first
+        if len(starts) == 0 or starts[-1] <= slot.start_time:
+            return len(starts), None
 
-        return len(self.slots), None
+        i = bisect.bisect_right(starts, slot.start_time)
+        return i, self.slots[i]
 
     def get_next(self, slot):
         i, slot_i = self._next(slot)
@@ -303,20 +375,23 @@ class Schedule(object):
 
     def insert_slot(self, slot):
         i, prev_slot = self._previous(slot)
-        if prev_slot != None:
+        if prev_slot is not None:
+            # compare the datetimes: the next free slot starts exactly
+            # at stop_time, which is rounded to the microsecond
             interval = (slot.start_time - prev_slot.stop_time).total_seconds()
             assert interval >= 0, \
                    ValueError("Slot overlaps end of previous slot by %d sec" % (
                 -interval))
 
-        if i+1 < self.num_slots():
-            next_slot = self.slots[i]
-            interval = (next_slot.start_time - slot.stop_time).total_seconds()
-            ## assert interval >= 0, \
-            ##     ValueError("Slot overlaps start of next slot by %d sec" % (
-            ##     -interval))
+        ## if i+1 < len(self.slots):
+        ##     next_slot = self.slots[i+1]
+        ##     interval = (next_slot.start_time - slot.stop_time).total_seconds()
+        ##     assert interval >= 0, \
+        ##         ValueError("Slot overlaps start of next slot by %d sec" % (
+        ##         -interval))
 
         self.slots.insert(i+1, slot)
+        self._starts.insert(i+1, slot.start_time)
         self.waste -= slot.size()
 
     ## def append_slot(self, slot):
@@ -331,10 +406,15 @@ class Schedule(object):
     ##     self.waste -= slot.size()
 
     def copy(self):
-        newsch = Schedule(self.start_time, self.stop_time)
+        # bypass __init__, since every field is copied from this schedule
+        newsch = Schedule.__new__(Schedule)
+        newsch.start_time = self.start_time
+        newsch.stop_time = self.stop_time
         newsch.waste = self.waste
         newsch.data  = self.data
-        newsch.slots = list(self.slots)
+        newsch.slots = self.slots.copy()
+        newsch._starts = self._starts.copy()
+        return newsch
 
     def get_waste(self):
         ## start_time, stop_time = self.get_free()
@@ -408,10 +488,8 @@ class OB(PersistentEntity):
     def to_rec(self):
         doc = super().to_rec()
 
-        _d = explode(doc['target'])
-        # body object not serializable to MongoDB
-        del _d['body']
-        doc['target'] = _d
+        # (body object is kept in target._body, so it is not exploded)
+        doc['target'] = explode(doc['target'])
         doc['inscfg'] = explode(doc['inscfg'])
         doc['telcfg'] = explode(doc['telcfg'])
         doc['envcfg'] = explode(doc['envcfg'])
@@ -428,33 +506,25 @@ class OB(PersistentEntity):
     def printed(self):
         return "{} ({})".format(self.id, self.comment)
 
+    # fields compared exactly by equivalent()
+    _exact_fields = operator.attrgetter('id', 'derived', 'comment')
+
     def equivalent(self, other):
-        if self.id != other.id:
+        if self is other:
+            return True
+        if self._exact_fields(self) != self._exact_fields(other):
             return False
-        if not np.isclose(self.priority, other.priority):
-            return False
-        if not np.isclose(self.total_time, other.total_time):
-            return False
-        if not np.isclose(self.acct_time, other.acct_time):
-            return False
-        if self.derived != other.derived:
-            return False
-        if self.comment != other.comment:
+        if not (_close(self.priority, other.priority) and
+                _close(self.total_time, other.total_time) and
+                _close(self.acct_time, other.acct_time)):
             return False
 
         # costly object compares
-        if not self.program.equivalent(other.program):
-            return False
-        if not self.target.equivalent(other.target):
-            return False
-        if not self.inscfg.equivalent(other.inscfg):
-            return False
-        if not self.telcfg.equivalent(other.telcfg):
-            return False
-        if not self.envcfg.equivalent(other.envcfg):
-            return False
-
-        return True
+        return (_equivalent(self.program, other.program) and
+                _equivalent(self.target, other.target) and
+                _equivalent(self.inscfg, other.inscfg) and
+                _equivalent(self.telcfg, other.telcfg) and
+                _equivalent(self.envcfg, other.envcfg))
 
     def longslew_ob(self, total_time):
         new_ob = OB(program=self.program, target=self.target,
@@ -506,12 +576,8 @@ class HSC_OB(OB):
         if isinstance(calib_inscfg, str) and calib_inscfg == 'default':
             # default calib_inscfg is a 30 sec single shot with same
             # filter as the science inscfg
-            calib_inscfg = HSCConfiguration(filter=inscfg.filter,
-                                            guiding=False, num_exp=1,
-                                            exp_time=30,
-                                            mode='IMAGE', dither='1',
-                                            pa=inscfg.pa,
-                                            comment='default 30 sec calib shot')
+            calib_inscfg = _calib30_inscfg(inscfg.filter, inscfg.pa,
+                                           'default 30 sec calib shot')
 
         elif calib_inscfg is None:
             if calib_tgtcfg is not None:
@@ -533,9 +599,7 @@ class HSC_OB(OB):
 
         if ('calib_tgtcfg' in doc and doc['calib_tgtcfg'] is not None and
             not isinstance(doc['calib_tgtcfg'], str)):
-            _d = explode(doc['calib_tgtcfg'])
-            del _d['body']
-            doc['calib_tgtcfg'] = _d
+            doc['calib_tgtcfg'] = explode(doc['calib_tgtcfg'])
 
         if ('calib_inscfg' in doc and doc['calib_inscfg'] is not None and
             not isinstance(doc['calib_inscfg'], str)):
@@ -543,34 +607,20 @@ class HSC_OB(OB):
 
         return doc
 
+    # fields compared exactly by equivalent(), besides those of OB
+    _hsc_exact_fields = operator.attrgetter('name', 'extra_params')
+
     def equivalent(self, other):
-        if not super().equivalent(other):
-            return False
-        if self.name != other.name:
+        if self is other:
+            return True
+        if self._hsc_exact_fields(self) != self._hsc_exact_fields(other):
             return False
-        if self.extra_params != other.extra_params:
+        if not super().equivalent(other):
             return False
 
         # costly object compares
-        if self.calib_tgtcfg is None:
-            if other.calib_tgtcfg is not None:
-                return False
-        else:
-            if other.calib_tgtcfg is None:
-                return False
-            elif not self.calib_tgtcfg.equivalent(other.calib_tgtcfg):
-                return False
-
-        if self.calib_inscfg is None:
-            if other.calib_inscfg is not None:
-                return False
-        else:
-            if other.calib_inscfg is None:
-                return False
-            elif not self.calib_inscfg.equivalent(other.calib_inscfg):
-                return False
-
-        return True
+        return (_equivalent(self.calib_tgtcfg, other.calib_tgtcfg) and
+                _equivalent(self.calib_inscfg, other.calib_inscfg))
 
     def setup_time(self):
         # how long approx to start OB
@@ -629,12 +679,8 @@ class HSC_OB(OB):
         return new_ob
 
     def calibration30_ob(self, total_time):
-        calib_inscfg = HSCConfiguration(filter=self.inscfg.filter,
-                                        guiding=False, num_exp=1,
-                                        exp_time=30,
-                                        mode='IMAGE', dither='1',
-                                        pa=self.inscfg.pa,
-                                        comment='30 sec calib shot')
+        calib_inscfg = _calib30_inscfg(self.inscfg.filter, self.inscfg.pa,
+                                       '30 sec calib shot')
         new_ob = HSC_OB(program=self.program, target=self.target,
                         telcfg=self.telcfg, inscfg=calib_inscfg,
                         envcfg=self.envcfg,
@@ -738,15 +784,27 @@ class StaticTarget(BaseTarget):
         self.ra, self.dec = normalize_radec_str(ra, dec)
         self.equinox = equinox
         self.comment = comment
+        # built from the coordinates when first needed (see body)
+        self._body = None
 
-        if self.ra is not None:
-            self._recalc_body()
+    @property
+    def body(self):
+        body = self._body
+        if body is None and self.ra is not None:
+            body = Body(self.name, self.ra, self.dec, self.equinox)
+            self._body = body
+        return body
+
+    @body.setter
+    def body(self, body):
+        self._body = body
 
     def _recalc_body(self):
-        self.body = Body(self.name, self.ra, self.dec, self.equinox)
+        # coordinates changed--rebuild body on next use
+        self._body = None
 
     def import_record(self, rec):
-        code = rec.get('code', '').strip()
+        code = _strip(rec.get('code', None))
         self.name = rec['name']
         self.ra, self.dec = normalize_radec_str(rec['ra'], rec['dec'])
 
@@ -763,7 +821,7 @@ class StaticTarget(BaseTarget):
             eq = int(eq)
             self.equinox = eq
 
-        self.comment = rec['comment'].strip()
+        self.comment = _strip(rec['comment'])
 
         self._recalc_body()
         return code
@@ -771,18 +829,14 @@ class StaticTarget(BaseTarget):
     def calc(self, observer, time_start):
         return self.body.calc(observer, time_start)
 
+    # fields compared by equivalent()
+    _exact_fields = operator.attrgetter('name', 'ra', 'dec', 'equinox',
+                                        'comment')
+
     def equivalent(self, other):
-        if self.name != other.name:
-            return False
-        if self.ra != other.ra:
-            return False
-        if self.dec != other.dec:
-            return False
-        if self.equinox != other.equinox:
-            return False
-        if self.comment != other.comment:
-            return False
-        return True
+        if self is other:
+            return True
+        return self._exact_fields(self) == self._exact_fields(other)
 
 
 class HSCTarget(StaticTarget):
@@ -796,12 +850,11 @@ class TelescopeConfiguration(object):
                  min_el_deg=15.0, max_el_deg=85.0,
                  min_az_deg=-269.0, max_az_deg=+269.0,
                  min_rot_deg=-269.0, max_rot_deg=+269.0):
-        super().__init__()
-        self.focus = focus
+        self.focus = _intern(focus)
         if dome is None:
             dome = 'open'
         else:
-            dome = dome.lower()
+            dome = _lower(dome)
         self.dome = dome
         self.min_el_deg = min_el_deg
         self.max_el_deg = max_el_deg
@@ -824,45 +877,37 @@ class TelescopeConfiguration(object):
         return (self.min_rot_deg, self.max_rot_deg)
 
     def import_record(self, rec):
-        code = rec.get('code', '').strip()
-        self.focus = rec['focus'].upper()
-        self.dome = rec['dome'].lower()
+        code = _strip(rec.get('code', None))
+        self.focus = _upper(rec['focus'])
+        self.dome = _lower(rec['dome'])
         self.min_el_deg = rec.get('min_el_deg', 30.0)
         self.max_el_deg = rec.get('max_el_deg', 85.0)
         self.min_az_deg = rec.get('min_az_deg', -269.0)
         self.max_az_deg = rec.get('max_az_deg', 269.0)
         self.min_rot_deg = rec.get('min_rot_deg', -269.0)
         self.max_rot_deg = rec.get('max_rot_deg', 269.0)
-        self.comment = rec['comment'].strip()
+        self.comment = _strip(rec['comment'])
         return code
 
+    # fields compared exactly by equivalent()
+    _exact_fields = operator.attrgetter('focus', 'dome', 'comment')
+
     def equivalent(self, other):
-        if self.focus != other.focus:
-            return False
-        if self.dome != other.dome:
-            return False
-        if not np.isclose(self.min_el_deg, other.min_el_deg):
-            return False
-        if not np.isclose(self.max_el_deg, other.max_el_deg):
-            return False
-        if not np.isclose(self.min_az_deg, other.min_az_deg):
-            return False
-        if not np.isclose(self.max_az_deg, other.max_az_deg):
-            return False
-        if not np.isclose(self.min_rot_deg, other.min_rot_deg):
-            return False
-        if not np.isclose(self.max_rot_deg, other.max_rot_deg):
-            return False
-        if self.comment != other.comment:
-            return False
-        return True
+        if self is other:
+            return True
+        # exact compares first, float compares last
+        return (self._exact_fields(self) == self._exact_fields(other) and
+                _close(self.min_el_deg, other.min_el_deg) and
+                _close(self.max_el_deg, other.max_el_deg) and
+                _close(self.min_az_deg, other.min_az_deg) and
+                _close(self.max_az_deg, other.max_az_deg) and
+                _close(self.min_rot_deg, other.min_rot_deg) and
+                _close(self.max_rot_deg, other.max_rot_deg))
 
 
 class InstrumentConfiguration(object):
 
     def __init__(self):
-        super().__init__()
-
         self.insname = None
         self.mode = None
         self.comment = ''
@@ -870,16 +915,18 @@ class InstrumentConfiguration(object):
 
 class HSCConfiguration(InstrumentConfiguration):
 
+    # Time for a filter exchange
+    # TODO: this needs to become more accurate
+    filter_change_time_sec = 35.0 * 60.0
+
     def __init__(self, filter=None, guiding=False, num_exp=1, exp_time=10,
                  mode='IMAGE', dither=1, offset_ra=0, offset_dec=0, pa=90,
                  dith1=60, dith2=None, skip=0, stop=None, comment=''):
         super().__init__()
 
         self.insname = 'HSC'
-        self.mode = mode
-        if filter is not None:
-            filter = filter.lower()
-        self.filter = filter
+        self.mode = _intern(mode)
+        self.filter = _lower(filter)
         self.dither = dither
         self.guiding = guiding
         self.num_exp = int(num_exp)
@@ -899,9 +946,7 @@ class HSCConfiguration(InstrumentConfiguration):
         self.comment = comment
 
     def calc_filter_change_time(self):
-        # TODO: this needs to become more accurate
-        filter_change_time_sec = 35.0 * 60.0
-        return filter_change_time_sec
+        return self.filter_change_time_sec
 
     def check_filter_installed(self, installed_filters):
         return self.filter in installed_filters
@@ -915,15 +960,15 @@ class HSCConfiguration(InstrumentConfiguration):
         return num_exp * self.exp_time
 
     def import_record(self, rec):
-        code = rec.get('code', '').strip()
+        code = _strip(rec.get('code', None))
         self.insname = 'HSC'
-        self.filter = rec['filter'].lower()
-        self.mode = rec['mode']
+        self.filter = _lower(rec['filter'])
+        self.mode = _intern(rec['mode'])
         self.dither = rec['dither']
         if isinstance(rec['guiding'], bool):
             self.guiding = rec['guiding']
         else:
-            self.guiding = rec['guiding'] in ('y', 'Y', 'yes', 'YES')
+            self.guiding = rec['guiding'] in _YES
         self.num_exp = int(rec['num_exp'])
         self.exp_time = float(rec['exp_time'])
         self.pa = float(rec['pa'])
@@ -933,41 +978,36 @@ class HSCConfiguration(InstrumentConfiguration):
         self.dith2 = float(rec['dith2'])
         self.skip = int(rec['skip'])
         self.stop = int(rec['stop'])
-        self.comment = rec['comment'].strip()
+        self.comment = _strip(rec['comment'])
         return code
 
+    # fields compared exactly by equivalent()
+    _exact_fields = operator.attrgetter('insname', 'mode', 'filter', 'dither',
+                                        'guiding', 'num_exp', 'skip', 'stop',
+                                        'comment')
+
     def equivalent(self, other):
-        if self.insname != other.insname:
-            return False
-        if self.mode != other.mode:
-            return False
-        if self.filter != other.filter:
-            return False
-        if self.dither != other.dither:
-            return False
-        if self.guiding != other.guiding:
-            return False
-        if self.num_exp != other.num_exp:
-            return False
-        if not np.isclose(self.exp_time, other.exp_time):
-            return False
-        if not np.isclose(self.offset_ra, other.offset_ra):
-            return False
-        if not np.isclose(self.offset_dec, other.offset_dec):
-            return False
-        if not np.isclose(self.pa, other.pa):
-            return False
-        if not np.isclose(self.dith1, other.dith1):
-            return False
-        if not np.isclose(self.dith2, other.dith2):
-            return False
-        if self.skip != other.skip:
-            return False
-        if self.stop != other.stop:
-            return False
-        if self.comment != other.comment:
-            return False
-        return True
+        if self is other:
+            return True
+        # exact compares first, float compares last
+        return (self._exact_fields(self) == self._exact_fields(other) and
+                _close(self.exp_time, other.exp_time) and
+                _close(self.offset_ra, other.offset_ra) and
+                _close(self.offset_dec, other.offset_dec) and
+                _close(self.pa, other.pa) and
+                _close(self.dith1, other.dith1) and
+                _close(self.dith2, other.dith2))
+
+
+@functools.lru_cache(maxsize=256)
+def _calib30_inscfg(filter, pa, comment):
+    """
+    Returns a 30 sec single shot HSCConfiguration for `filter` and `pa`.
+    Instances are shared between OBs, so they must not be modified.
+    """
+    return HSCConfiguration(filter=filter, guiding=False, num_exp=1,
+                            exp_time=30, mode='IMAGE', dither='1',
+                            pa=pa, comment=comment)
 
 
 class PPCConfiguration(InstrumentConfiguration):
@@ -979,7 +1019,7 @@ class PPCConfiguration(InstrumentConfiguration):
 
         self.insname = 'PPC'
         self.mode = 'SPEC'
-        self.resolution = resolution
+        self.resolution = _intern(resolution)
         self.guiding = guiding
         self.exp_time = float(exp_time)
         self.num_exp = 1
@@ -996,32 +1036,29 @@ class PPCConfiguration(InstrumentConfiguration):
         return self.num_exp
 
     def import_record(self, rec):
-        code = rec.get('code', '').strip()
+        code = _strip(rec.get('code', None))
         self.insname = 'PFS'
-        self.resolution = rec['resolution']
+        self.resolution = _intern(rec['resolution'])
         if isinstance(rec['guiding'], bool):
             self.guiding = rec['guiding']
         else:
-            self.guiding = rec['guiding'] in ('y', 'Y', 'yes', 'YES')
+            self.guiding = rec['guiding'] in _YES
         self.exp_time = float(rec['exp_time'])
         self.pa = float(rec['pa'])
-        self.comment = rec['comment'].strip()
+        self.comment = _strip(rec['comment'])
         return code
 
+    # fields compared exactly by equivalent()
+    _exact_fields = operator.attrgetter('insname', 'resolution', 'guiding',
+                                        'comment')
+
     def equivalent(self, other):
-        if self.insname != other.insname:
-            return False
-        if self.resolution != other.resolution:
-            return False
-        if self.guiding != other.guiding:
-            return False
-        if not np.isclose(self.exp_time, other.exp_time):
-            return False
-        if not np.isclose(self.pa, other.pa):
-            return False
-        if self.comment != other.comment:
-            return False
-        return True
+        if self is other:
+            return True
+        # exact compares first, float compares last
+        return (self._exact_fields(self) == self._exact_fields(other) and
+                _close(self.exp_time, other.exp_time) and
+                _close(self.pa, other.pa))
 
 
 class PFSConfiguration(InstrumentConfiguration):
@@ -1033,7 +1070,7 @@ class PFSConfiguration(InstrumentConfiguration):
 
         self.insname = 'PFS'
         self.mode = 'SPEC'
-        self.resolution = resolution
+        self.resolution = _intern(resolution)
         self.exp_time = float(exp_time)
         self.num_exp = 1
         self.comment = comment
@@ -1051,116 +1088,72 @@ class PFSConfiguration(InstrumentConfiguration):
         return self.num_exp
 
     def import_record(self, rec):
-        code = rec.get('code', '').strip()
+        code = _strip(rec.get('code', None))
         self.insname = 'PFS'
-        self.resolution = rec['resolution']
+        self.resolution = _intern(rec['resolution'])
         self.exp_time = float(rec['exp_time'])
-        self.comment = rec['comment'].strip()
+        self.comment = _strip(rec['comment'])
         return code
 
+    # fields compared exactly by equivalent()
+    _exact_fields = operator.attrgetter('insname', 'resolution', 'comment')
+
     def equivalent(self, other):
-        if self.insname != other.insname:
-            return False
-        if self.resolution != other.resolution:
-            return False
-        if not np.isclose(self.exp_time, other.exp_time):
-            return False
-        if self.comment != other.comment:
-            return False
-        return True
+        if self is other:
+            return True
+        # exact compares first, float compares last
+        return (self._exact_fields(self) == self._exact_fields(other) and
+                _close(self.exp_time, other.exp_time))
 
 
 class EnvironmentConfiguration(object):
 
     # Default time zone for lower_time_limit and upper_time_limit
-    default_timezone = tz.UTC
+    default_timezone = _UTC
 
     def __init__(self, seeing=None, airmass=None, moon='any',
                  transparency=None, moon_sep=None, lower_time_limit=None,
                  upper_time_limit=None, comment=''):
-        super().__init__()
         self.seeing = seeing
         self.airmass = airmass
         self.transparency = transparency
         self.moon_sep = moon_sep
-        if (moon is None) or (len(moon) == 0):
-            moon = 'any'
-        self.moon = moon.lower()
+        # unset moon means any moon phase
+        self.moon = _lower(moon or 'any')
         self.lower_time_limit = lower_time_limit
         self.upper_time_limit = upper_time_limit
         self.comment = comment
 
     def import_record(self, rec):
-        code = rec.get('code', '').strip()
+        code = _strip(rec.get('code', None))
 
-        if isinstance(rec['seeing'], float):
-            self.seeing = rec['seeing']
-        else:
-            seeing = rec['seeing'].strip()
-            if len(seeing) != 0:
-                self.seeing = float(seeing)
-            else:
-                self.seeing = None
+        self.seeing = _opt_float(rec['seeing'])
+        self.airmass = _opt_float(rec['airmass'])
 
-        if isinstance(rec['airmass'], float):
-            self.airmass = rec['airmass']
-        else:
-            airmass = rec['airmass'].strip()
-            if len(airmass) != 0:
-                self.airmass = float(airmass)
-            else:
-                self.airmass = None
-
-        self.moon = rec['moon']
+        self.moon = _lower(rec['moon'] or 'any')
         self.moon_sep = float(rec['moon_sep'])
         self.transparency = float(rec['transparency'])
-        if rec['lower_time_limit'] is None:
-            self.lower_time_limit = None
-        elif isinstance(rec['lower_time_limit'], datetime):
-            # See NOTE [1]
-            t = rec['lower_time_limit']
-            self.lower_time_limit = t.replace(tzinfo=tz.UTC)
-        else:
-            try:
-                self.lower_time_limit = parse_date_time(rec['lower_time_limit'],
-                                                        self.default_timezone)
-            except KeyError as e:
-                self.lower_time_limit = None
-
-        if rec['upper_time_limit'] is None:
-            self.upper_time_limit = None
-        elif isinstance(rec['upper_time_limit'], datetime):
-            # See NOTE [1]
-            t = rec['upper_time_limit']
-            self.upper_time_limit = t.replace(tzinfo=tz.UTC)
-        else:
-            try:
-                self.upper_time_limit = parse_date_time(rec['upper_time_limit'],
-                                                        self.default_timezone)
-            except KeyError as e:
-                self.upper_time_limit = None
+        self.lower_time_limit = _opt_date_time(rec['lower_time_limit'],
+                                               self.default_timezone)
+        self.upper_time_limit = _opt_date_time(rec['upper_time_limit'],
+                                               self.default_timezone)
 
-        self.comment = rec['comment'].strip()
+        self.comment = _strip(rec['comment'])
         return code
 
+    # fields compared exactly by equivalent()
+    _exact_fields = operator.attrgetter('moon', 'lower_time_limit',
+                                        'upper_time_limit', 'comment')
+
     def equivalent(self, other):
-        if not np.isclose(self.seeing, other.seeing):
-            return False
-        if not np.isclose(self.airmass, other.airmass):
-            return False
-        if self.moon != other.moon:
-            return False
-        if not np.isclose(self.moon_sep, other.moon_sep):
-            return False
-        if not np.isclose(self.transparency, other.transparency):
-            return False
-        if self.lower_time_limit != other.lower_time_limit:
-            return False
-        if self.upper_time_limit != other.upper_time_limit:
-            return False
-        if self.comment != other.comment:
-            return False
-        return True
+        if self is other:
+            return True
+        # exact compares first, float compares last
+        return (self._exact_fields(self) == self._exact_fields(other) and
+                _close(self.seeing, other.seeing) and
+                _close(self.airmass, other.airmass) and
+                _close(self.moon_sep, other.moon_sep) and
+                _close(self.transparency, other.transparency))
 
 
 class Executed_OB(PersistentEntity):
@@ -1192,13 +1185,12 @@ class Executed_OB(PersistentEntity):
         super().from_rec(dct)
 
         # comes in as a list from MongoDB, but we want a tuple
-        self.ob_key = tuple(self.ob_key)
+        if isinstance(self.ob_key, list):
+            self.ob_key = tuple(self.ob_key)
 
         # See NOTE [1]
-        if self.time_start is not None:
-            self.time_start = self.time_start.replace(tzinfo=tz.UTC)
-        if self.time_stop is not None:
-            self.time_stop = self.time_stop.replace(tzinfo=tz.UTC)
+        self.time_start = _db_time(self.time_start)
+        self.time_stop = _db_time(self.time_stop)
 
 class HSC_Exposure(PersistentEntity):
     """
@@ -1247,15 +1239,13 @@ class HSC_Exposure(PersistentEntity):
         super().from_rec(dct)
 
         # comes in as a list from MongoDB, but we want a tuple
-        if self.ob_key is not None:
-            # non-queue frames will have a null ob_key
+        # (non-queue frames will have a null ob_key)
+        if isinstance(self.ob_key, list):
             self.ob_key = tuple(self.ob_key)
 
         # See NOTE [1]
-        if self.time_start is not None:
-            self.time_start = self.time_start.replace(tzinfo=tz.UTC)
-        if self.time_stop is not None:
-            self.time_stop = self.time_stop.replace(tzinfo=tz.UTC)
+        self.time_start = _db_time(self.time_start)
+        self.time_stop = _db_time(self.time_stop)
 
     def __str__(self):
         return self.exp_id
@@ -1309,15 +1299,13 @@ class PFS_Exposure(PersistentEntity):
         super().from_rec(dct)
 
         # comes in as a list from MongoDB, but we want a tuple
-        if self.ob_key is not None:
-            # non-queue frames will have a null ob_key
+        # (non-queue frames will have a null ob_key)
+        if isinstance(self.ob_key, list):
             self.ob_key = tuple(self.ob_key)
 
         # See NOTE [1]
-        if self.time_start is not None:
-            self.time_start = self.time_start.replace(tzinfo=tz.UTC)
-        if self.time_stop is not None:
-            self.time_stop = self.time_stop.replace(tzinfo=tz.UTC)
+        self.time_start = _db_time(self.time_start)
+        self.time_stop = _db_time(self.time_stop)
 
     def __str__(self):
         return self.exp_id
@@ -1336,17 +1324,25 @@ class SavedStateRec(PersistentEntity):
         super().from_rec(dct)
 
         # See NOTE [1]
-        if self.time_update is not None:
-            self.time_update = self.time_update.replace(tzinfo=tz.UTC)
+        self.time_update = _db_time(self.time_update)
 
     @property
     def key(self):
         return dict(name='current')
 
 
+# the same time limit strings repeat across many records
+_fromisoformat = functools.lru_cache(maxsize=1024)(datetime.fromisoformat)
+
 def parse_date_time(dt_str, default_timezone):
     if len(dt_str) > 0:
-        dt = dateutil.parser.parse(dt_str)
+        try:
+            # fast path for the usual ISO 8601 dates
+            dt = _fromisoformat(dt_str)
+        except ValueError:
+            # not cached: dateutil fills in missing fields (e.g. the date
+            # of '20:30') from the current date
+            dt = dateutil.parser.parse(dt_str)
         if dt.tzinfo is None:
             dt = dt.replace(tzinfo=default_timezone)
     else:
@@ -1354,6 +1350,33 @@ def parse_date_time(dt_str, default_timezone):
     return dt
 
 
+def _opt_date_time(val, default_timezone):
+    """
+    Optional date/time field of a record: None, a datetime from the
+    database (see NOTE [1]) or a string to parse.
+    """
+    if val is None:
+        return None
+    if isinstance(val, datetime):
+        return _db_time(val)
+    try:
+        return parse_date_time(val, default_timezone)
+    except KeyError as e:
+        return None
+
+def _opt_float(val):
+    """
+    Optional float field of a record: a float, or a possibly empty
+    string.  An empty (or None) value is None.
+    """
+    if isinstance(val, float):
+        return val
+    val = _strip(val)
+    if len(val) != 0:
+        return float(val)
+    return None
+
+
 def normalize_radec_str(ra_str, dec_str):
     if ra_str is None or ra_str == '':
         ra = ra_str
@@ -1362,28 +1385,102 @@ def normalize_radec_str(ra_str, dec_str):
         # decimal degrees. Otherwise, parse ra as a sexagesimal value,
         # i.e., HH:MM:SS.fff.
         if isinstance(ra_str, str) and ':' in ra_str:
-            ra_ang = Angle(ra_str, unit=units.hour)
+            ra_hr = _sexagesimal_str_to_num(ra_str, 24)
         else:
-            ra_ang = Angle(float(ra_str), unit=units.deg)
+            ra_hr = float(ra_str) * _DEG_TO_HOUR
 
-        ra = ra_ang.to_string(unit=units.hour, sep=':', precision=3, pad=True)
+        if ra_hr is None or not math.isfinite(ra_hr):
+            # let astropy handle (or reject) anything unusual
+            if isinstance(ra_str, str) and ':' in ra_str:
+                ra_ang = Angle(ra_str, unit=units.hour)
+            else:
+                ra_ang = Angle(float(ra_str), unit=units.deg)
+            ra = ra_ang.to_string(unit=units.hour, sep=':', precision=3,
+                                  pad=True)
+        else:
+            ra = _num_to_sexagesimal_str(ra_hr, 3, False)
 
     if dec_str is None or dec_str == '':
         dec = dec_str
     else:
         if isinstance(dec_str, str) and ':' in dec_str:
-            dec_ang = Angle(dec_str, unit=units.deg)
+            dec_deg = _sexagesimal_str_to_num(dec_str, None)
         else:
-            dec_ang = Angle(float(dec_str), unit=units.deg)
+            dec_deg = float(dec_str)
 
-        dec = dec_ang.to_string(sep=':', precision=2, pad=True,
-                                alwayssign=True)
+        if dec_deg is None or not math.isfinite(dec_deg):
+            if isinstance(dec_str, str) and ':' in dec_str:
+                dec_ang = Angle(dec_str, unit=units.deg)
+            else:
+                dec_ang = Angle(float(dec_str), unit=units.deg)
+            dec = dec_ang.to_string(sep=':', precision=2, pad=True,
+                                    alwayssign=True)
+        else:
+            dec = _num_to_sexagesimal_str(dec_deg, 2, True)
     return (ra, dec)
 
+# astropy's conversion factor, so that results match Angle exactly
+_DEG_TO_HOUR = units.deg.to(units.hourangle)
+
+_sexagesimal_re = re.compile(r'([+-]?)(\d+):(\d+):(\d+(?:\.\d*)?|\.\d+)')
+
+def _sexagesimal_str_to_num(val_str, limit):
+    """
+    Convert a plain '[+-]D:M:S' string to a decimal value in units of D,
+    computed the same way as Angle does.  Returns None for any other
+    form, or if a field is out of range (D must be below `limit`, if
+    given), so that the caller can defer to Angle.
+    """
+    match = _sexagesimal_re.fullmatch(val_str)
+    if match is None:
+        return None
+    sign, d_s, m_s, s_s = match.groups()
+    d, m, s = int(d_s), int(m_s), float(s_s)
+    if m >= 60 or s >= 60.0 or (limit is not None and d >= limit):
+        return None
+    val = d + m / 60.0 + s / 3600.0
+    if sign == '-':
+        return -val
+    return val
+
+def _num_to_sexagesimal_str(val, precision, alwayssign):
+    """
+    Format a decimal value as a 'DD:MM:SS.s..' string, reproducing
+    Angle.to_string(sep=':', pad=True), including its rounding.
+    """
+    sign = math.copysign(1.0, val)
+    df, d = math.modf(abs(val))
+    mf, m = math.modf(df * 60.0)
+    sec = mf * 60.0
+    # carry when the seconds would round up to 60
+    if sec >= 60.0 - 10.0 ** -precision:
+        sec = 0.0
+        m += 1.0
+    if m >= 60.0:
+        m = 0.0
+        d += 1.0
+    sec_s = "%.*f" % (precision, sec)
+    if len(sec_s) == 1 or sec_s[1] == '.':
+        sec_s = '0' + sec_s
+    text = "%0*.0f:%02d:%s" % (3 if sign < 0 else 2, math.copysign(d, sign),
+                               m, sec_s)
+    if alwayssign and not text.startswith('-'):
+        text = '+' + text
+    return text
+
 #
 ### Functions for going from database record to Python object
 ###   (see q_query.py)
 #
+
+# exposure class by instrument name
+_EXPOSURE_CLS = {'HSC': HSC_Exposure, 'PFS': PFS_Exposure}
+
+# (OB, target, instrument configuration) classes by instrument name
+_OB_DISPATCH = {'HSC': (HSC_OB, HSCTarget, HSCConfiguration),
+                'PPC': (PPC_OB, StaticTarget, PPCConfiguration),
+                'PFS': (PFS_OB, StaticTarget, PFSConfiguration)}
+
 def make_program(dct):
     pgm = Program(dct['proposal'])
     pgm.from_rec(dct)
@@ -1401,10 +1498,7 @@ def make_executed_ob(dct):
 
 def make_exposure(dct):
     insname = dct.get('insname', None)
-    if insname == 'PFS':
-        exp = PFS_Exposure()
-    else:
-        exp = HSC_Exposure()
+    exp = _EXPOSURE_CLS.get(insname, HSC_Exposure)()
 
     exp.from_rec(dct)
     return exp
@@ -1414,36 +1508,61 @@ def make_saved_state(dct):
     rec.from_rec(dct)
     return rec
 
-def make_ob(dct, program):
+# Targets and configurations imported by make_ob(), by record contents.
+# The OBs of a program share a handful of these.
+_import_cache = {}
+_import_cache_max = 4096
 
-    telcfg = TelescopeConfiguration()
-    telcfg.import_record(dct['telcfg'])
+def _import_cached(cls, rec):
+    """
+    Returns a new `cls` object with `rec` imported.  Identical records
+    are only imported once; callers get a shallow copy of the cached
+    object, so they can modify it.
+    """
+    try:
+        # include the types, so that e.g. True and 1 are not confused
+        key = (cls, frozenset((k, type(v), v) for k, v in rec.items()))
+        obj = _import_cache.get(key, None)
+    except TypeError:
+        # unhashable field value--don't cache
+        key, obj = None, None
+
+    if obj is None:
+        obj = cls()
+        obj.import_record(rec)
+        if key is not None:
+            if len(_import_cache) >= _import_cache_max:
+                _import_cache.clear()
+            _import_cache[key] = obj
+    return copy.copy(obj)
 
-    envcfg = EnvironmentConfiguration()
-    envcfg.import_record(dct['envcfg'])
+def make_ob(dct, program):
 
-    insname = dct['inscfg']['insname']
+    telcfg = _import_cached(TelescopeConfiguration, dct['telcfg'])
+    envcfg = _import_cached(EnvironmentConfiguration, dct['envcfg'])
 
-    if insname == 'HSC':
-        target = HSCTarget()
-        inscfg = HSCConfiguration()
+    insname = dct['inscfg']['insname']
+    try:
+        ob_cls, target_cls, inscfg_cls = _OB_DISPATCH[insname]
+    except KeyError:
+        raise ValueError(f"instrument not recognized: '{insname}'")
 
-        target.import_record(dct['target'])
-        inscfg.import_record(dct['inscfg'])
+    target = _import_cached(target_cls, dct['target'])
+    inscfg = _import_cached(inscfg_cls, dct['inscfg'])
 
+    if insname == 'HSC':
         if dct['calib_tgtcfg'] is None:
             # older programs didn't have this
             calib_tgtcfg = None
         else:
-            calib_tgtcfg = HSCTarget()
-            calib_tgtcfg.import_record(dct['calib_tgtcfg'])
+            calib_tgtcfg = _import_cached(HSCTarget, dct['calib_tgtcfg'])
 
         if dct['calib_inscfg'] is None:
             # older programs didn't have this
             calib_inscfg = None
         else:
-            calib_inscfg = HSCConfiguration()
-            calib_inscfg.import_record(dct['calib_inscfg'])
+            calib_inscfg = _import_cached(HSCConfiguration,
+                                          dct['calib_inscfg'])
 
         # older programs didn't have this
         extra_params = dct.get('extra_params', '')
@@ -1457,33 +1576,12 @@ def make_ob(dct, program):
                     comment=dct['comment'],
                     extra_params=extra_params)
 
-    elif insname == 'PPC':
-        target = StaticTarget()
-        inscfg = PPCConfiguration()
-
-        target.import_record(dct['target'])
-        inscfg.import_record(dct['inscfg'])
-
-        ob = PPC_OB(id=dct['id'], program=program, target=target,
-                    telcfg=telcfg, inscfg=inscfg, envcfg=envcfg,
-                    total_time=dct['total_time'], acct_time=dct['acct_time'],
-                    priority=dct['priority'], comment=dct['comment'])
-
-    elif insname == 'PFS':
-        target = StaticTarget()
-        inscfg = PFSConfiguration()
-
-        target.import_record(dct['target'])
-        inscfg.import_record(dct['inscfg'])
-
-        ob = PFS_OB(id=dct['id'], program=program, target=target,
+    else:
+        ob = ob_cls(id=dct['id'], program=program, target=target,
                     telcfg=telcfg, inscfg=inscfg, envcfg=envcfg,
                     total_time=dct['total_time'], acct_time=dct['acct_time'],
                     priority=dct['priority'], comment=dct['comment'])
 
-    else:
-        raise ValueError(f"instrument not recognized: '{insname}'")
-
     ob._id = dct['_id']
     ob._save_tstamp = dct.get('_save_tstamp', None)
 
@@ -494,9 +494,9 @@ class ControlPanel(PlBase.Plugin):
         # store programs into db
         try:
             qt = self.qa.get_table('program')
-            for key in sdlr.programs:
-                self.logger.info("adding record for program '%s'" % (str(key)))
-                qt.put(sdlr.programs[key])
+            qt.put_many(sdlr.programs.values())
+            self.logger.info("added records for %d programs" % (
+                len(sdlr.programs)))
 
         except Exception as e:
             self.logger.error('Unexpected error while updating program table in database: %s' % str(e), exc_info=True)
@@ -504,9 +504,8 @@ class ControlPanel(PlBase.Plugin):
         # store OBs into db
         try:
             qt = self.qa.get_table('ob')
-            for ob in sdlr.oblist:
-                self.logger.info("adding record for OB '%s'" % (str(ob)))
-                qt.put(ob)
+            qt.put_many(sdlr.oblist)
+            self.logger.info("added records for %d OBs" % (len(sdlr.oblist)))
 
         except Exception as e:
             self.logger.error('Unexpected error while updating ob table in database: %s' % str(e), exc_info=True)
@@ -7,7 +7,7 @@ from dateutil import tz
 
 # third-party imports
 import yaml
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 
 from qplan import entity
 """
@@ -135,6 +135,21 @@ class QueueTable(object):
         doc['_save_tstamp'] = datetime.now(tz=tz.UTC)
         self.tbl.update_one(pyobj.key, {'$set': doc}, upsert=True)
 
+    def put_many(self, pyobjs):
+        """Save a sequence of objects to this table in one bulk request."""
+        requests = []
+        tstamp = datetime.now(tz=tz.UTC)
+        for pyobj in pyobjs:
+            if pyobj._tblname != self._tblname:
+                raise ValueError("Trying to save '{}' object to '{}' table".format(pyobj._tblname, self._tblname))
+
+            doc = pyobj.to_rec()
+            doc['_save_tstamp'] = tstamp
+            requests.append(UpdateOne(pyobj.key, {'$set': doc}, upsert=True))
+
+        if len(requests) > 0:
+            self.tbl.bulk_write(requests, ordered=False)
+
 
 # Table map of serialization functions from MongoDB record to Python object.
 # Used by QueueTable objects.
@@ -1,9 +1,13 @@
 import unittest
-from datetime import timedelta
+from datetime import timedelta, date
 import math
+import copy
+import pickle
 from dateutil import tz
 
 import ephem
+from astropy.coordinates import Angle
+from astropy import units
 
 from qplan import misc, entity
 from qplan.util import calcpos
@@ -156,6 +160,226 @@ class TestEntity01(unittest.TestCase):
         slot = entity.Slot(time1, 3600.0 * 2)
         res = slot.split(time2, 3600.0)
         self.assertTrue(res[0].stop_time == time2)
+        self.assertEqual(res[1].stop_time, res[2].start_time)
+
+    def test_schedule_insert(self):
+        time1 = self.obs.get_date("2010-10-18 21:00")
+        time2 = self.obs.get_date("2010-10-18 23:00")
+        sch = entity.Schedule(time1, time2)
+        slot_a = entity.Slot(time1, 1800.0)
+        slot_b = entity.Slot(time1 + timedelta(hours=1), 1800.0)
+        slot_c = entity.Slot(time1 + timedelta(minutes=30), 1800.0)
+        # insert out of time order
+        for slot in (slot_b, slot_a, slot_c):
+            sch.insert_slot(slot)
+        self.assertEqual(sch.slots, [slot_a, slot_c, slot_b])
+        self.assertEqual(sch.get_previous(slot_c), slot_c)
+        self.assertEqual(sch.get_next(slot_c), slot_b)
+        self.assertEqual(sch.get_next(slot_b), None)
+        self.assertTrue(math.isclose(sch.get_waste(), 3600.0 * 0.5))
+
+        slot_d = entity.Slot(time1 - timedelta(hours=1), 60.0)
+        self.assertEqual(sch.get_previous(slot_d), None)
+        self.assertEqual(sch.get_next(slot_d), slot_a)
+
+        sch2 = sch.copy()
+        self.assertEqual(sch2.slots, sch.slots)
+        self.assertEqual(sch2.get_waste(), sch.get_waste())
+        sch2.insert_slot(slot_d)
+        self.assertEqual(sch.num_slots(), 3)
+        self.assertEqual(sch2.slots[0], slot_d)
+
+    def test_schedule_insert_after_split(self):
+        # as the scheduler does: split the free slot with a non-integer
+        # length, insert the piece, then insert the next free slot
+        time1 = self.obs.get_date("2010-10-18 21:00")
+        time2 = self.obs.get_date("2010-10-19 05:00")
+        sch = entity.Schedule(time1, time2)
+        for i in range(200):
+            free = sch.next_free_slot()
+            slot_b, slot_c, slot_d = free.split(free.start_time,
+                                                61.0 + i / 7.0 + 1e-4)
+            sch.insert_slot(slot_c)
+        free = sch.next_free_slot()
+        sch.insert_slot(free)
+        self.assertEqual(sch.slots[-1], free)
+        self.assertEqual(sch.num_slots(), 201)
+        self.assertTrue(math.isclose(sch.get_waste(), 0.0, abs_tol=1e-3))
+
+    def test_ob_to_rec(self):
+        pgm = entity.Program('S24A-QN001', instruments=['hsc'])
+        tgt = entity.HSCTarget("vega", vega[0], vega[1])
+        ob = entity.HSC_OB(id='ob1', program=pgm, target=tgt,
+                           telcfg=entity.TelescopeConfiguration(focus='P_OPT2'),
+                           inscfg=entity.HSCConfiguration(filter='g'),
+                           envcfg=entity.EnvironmentConfiguration(),
+                           total_time=600.0, acct_time=600.0)
+        doc = ob.to_rec()
+        self.assertEqual(doc['program'], 'S24A-QN001')
+        self.assertEqual(doc['target']['name'], 'vega')
+        self.assertFalse('body' in doc['target'])
+        self.assertEqual(doc['inscfg']['filter'], 'g')
+
+        # setting a field updates the record and key
+        ob.comment = 'changed'
+        self.assertEqual(ob.to_rec()['comment'], 'changed')
+        self.assertEqual(ob.key, dict(program='S24A-QN001', name='ob1'))
+        ob.name = 'ob2'
+        self.assertEqual(ob.key, dict(program='S24A-QN001', name='ob2'))
+
+        # configurations and targets are reloaded in place by filetypes
+        new_cfg = entity.HSCConfiguration(filter='r', exp_time=60)
+        ob.inscfg.__dict__.update(new_cfg.__dict__)
+        new_tgt = entity.HSCTarget("vega", "10:00:00", "+20:00:00")
+        ob.target.__dict__.update(new_tgt.__dict__)
+        doc = ob.to_rec()
+        self.assertEqual(doc['inscfg']['filter'], 'r')
+        self.assertEqual(doc['inscfg']['exp_time'], 60.0)
+        self.assertEqual(doc['target']['ra'], '10:00:00.000')
+
+        # round trip through a database record
+        # (seeing is left unset)
+        ob.envcfg = entity.EnvironmentConfiguration(airmass=1.5,
+                                                    transparency=0.5,
+                                                    moon_sep=30.0)
+        doc = ob.to_rec()
+        doc['_id'] = 1
+        ob2 = entity.make_ob(doc, pgm)
+        self.assertTrue(isinstance(ob2, entity.HSC_OB))
+        self.assertTrue(ob.equivalent(ob2))
+
+        # OBs made from the same record do not share configurations
+        ob3 = entity.make_ob(doc, pgm)
+        self.assertTrue(ob2.equivalent(ob3))
+        ob3.inscfg.filter = 'i'
+        self.assertEqual(ob2.inscfg.filter, 'r')
+
+    def test_copy_pickle(self):
+        pgm = entity.Program('S24A-QN001', instruments=['hsc'])
+        ob = entity.HSC_OB(id='ob1', program=pgm,
+                           target=entity.HSCTarget("vega", vega[0], vega[1]),
+                           telcfg=entity.TelescopeConfiguration(focus='P_OPT2'),
+                           inscfg=entity.HSCConfiguration(filter='g'),
+                           envcfg=entity.EnvironmentConfiguration())
+        # reading the key must not make an entity uncopyable
+        self.assertEqual(ob.key, dict(program='S24A-QN001', name='ob1'))
+        for obj in (pgm, ob):
+            obj2 = copy.deepcopy(obj)
+            self.assertEqual(obj2.key, obj.key)
+            obj2 = pickle.loads(pickle.dumps(obj))
+            self.assertEqual(obj2.key, obj.key)
+            self.assertTrue(obj2.equivalent(obj))
+
+    def test_import_record(self):
+        recs = [dict(code='t1', name='vega', ra=vega[0], dec=vega[1],
+                     equinox=2000, comment=''),
+                dict(code='t2', name='altair', ra=297.8738, dec=8.9065,
+                     eq='J2000', comment=' bright '),
+                ]
+        tgts = []
+        for rec in recs:
+            tgt = entity.HSCTarget()
+            self.assertEqual(tgt.import_record(rec), rec['code'])
+            self.assertEqual((tgt.ra, tgt.dec),
+                             entity.normalize_radec_str(rec['ra'], rec['dec']))
+            self.assertEqual(tgt.equinox, 2000)
+            tgts.append(tgt)
+        self.assertEqual(tgts[1].comment, 'bright')
+
+    def test_normalize_radec_str(self):
+        self.assertEqual(entity.normalize_radec_str(' 18:36:56.3', '38:47:1'),
+                         ('18:36:56.300', '+38:47:01.00'))
+        self.assertEqual(entity.normalize_radec_str(297.8738, 8.9065),
+                         ('19:51:29.712', '+08:54:23.40'))
+        # sign of a negative declination with a zero degree field
+        self.assertEqual(entity.normalize_radec_str('00:22:13.44', '-00:36:25.2'),
+                         ('00:22:13.440', '-00:36:25.20'))
+        # rounding carries into the minutes and degrees fields
+        self.assertEqual(entity.normalize_radec_str('23:59:59.9999',
+                                                    '-10:59:59.999'),
+                         ('24:00:00.000', '-11:00:00.00'))
+        self.assertEqual(entity.normalize_radec_str(None, ''), (None, ''))
+
+    def test_normalize_radec_str_matches_angle(self):
+        def angle_str(ra, dec):
+            if isinstance(ra, str):
+                ra_ang = Angle(ra, unit=units.hour)
+            else:
+                ra_ang = Angle(ra, unit=units.deg)
+            dec_ang = Angle(dec, unit=units.deg)
+            return (ra_ang.to_string(unit=units.hour, sep=':', precision=3,
+                                     pad=True),
+                    dec_ang.to_string(sep=':', precision=2, pad=True,
+                                      alwayssign=True))
+
+        # rounding ties on inputs with extra digits
+        for ra, dec in [('17:29:48.0625', '07:09:46.005'),
+                        ('01:02:03.0005', '-01:02:03.015'),
+                        ('23:59:59.9995', '-00:00:59.995'),
+                        (262.45026, -7.162779)]:
+            self.assertEqual(entity.normalize_radec_str(ra, dec),
+                             angle_str(ra, dec))
+        # out of range or malformed fields are rejected, as by Angle
+        for ra in ['10:75:00', '10:00:75', '12:-5:00', '12.5:30:00',
+                   '12:30:', '25:00:00']:
+            with self.assertRaises(ValueError):
+                Angle(ra, unit=units.hour)
+            with self.assertRaises(ValueError):
+                entity.normalize_radec_str(ra, '+10:00:00')
+        for dec in ['10:75:00', '10:00:75', '10:-5:00']:
+            with self.assertRaises(ValueError):
+                entity.normalize_radec_str('10:00:00', dec)
+
+    def test_equivalent(self):
+        env1 = entity.EnvironmentConfiguration(seeing=0.8, airmass=1.5)
+        env2 = entity.EnvironmentConfiguration(seeing=0.8 + 1e-9, airmass=1.5)
+        self.assertTrue(env1.equivalent(env2))
+        # unset values are only equivalent to unset values
+        self.assertTrue(entity.EnvironmentConfiguration().equivalent(
+            entity.EnvironmentConfiguration()))
+        env2.seeing = None
+        self.assertFalse(env1.equivalent(env2))
+        self.assertFalse(env2.equivalent(env1))
+
+        # moon is normalized the same way when imported from a spreadsheet
+        env3 = entity.EnvironmentConfiguration()
+        env3.import_record(dict(code='e1', seeing=0.8, airmass=1.5,
+                                moon='Dark', moon_sep=30, transparency=0.4,
+                                lower_time_limit=None, upper_time_limit=None,
+                                comment=''))
+        self.assertEqual(env3.moon, 'dark')
+        self.assertTrue(env3.equivalent(
+            entity.EnvironmentConfiguration(seeing=0.8, airmass=1.5,
+                                            moon='DARK', moon_sep=30.0,
+                                            transparency=0.4)))
+
+        cfg1 = entity.HSCConfiguration(filter='g', exp_time=30)
+        cfg2 = entity.HSCConfiguration(filter='g', exp_time=30.0000001)
+        self.assertTrue(cfg1.equivalent(cfg2))
+        cfg2.exp_time = 31
+        self.assertFalse(cfg1.equivalent(cfg2))
+        # floats are compared with np.isclose() tolerances
+        cfg1 = entity.HSCConfiguration(filter='g', exp_time=1000, pa=1.2345675)
+        cfg2 = entity.HSCConfiguration(filter='g', exp_time=1000.001,
+                                       pa=1.2345674999)
+        self.assertTrue(cfg1.equivalent(cfg2))
+
+    def test_parse_date_time(self):
+        dt = entity.parse_date_time("2024-03-01 20:30:00", self.hst)
+        self.assertEqual(dt, self.obs.get_date("2024-03-01 20:30"))
+        dt = entity.parse_date_time("2024-03-02T06:30:00+00:00", self.hst)
+        self.assertEqual(dt, self.obs.get_date("2024-03-01 20:30"))
+        # non-ISO formats are still accepted
+        dt = entity.parse_date_time("Mar 1 2024 8:30PM", self.hst)
+        self.assertEqual(dt, self.obs.get_date("2024-03-01 20:30"))
+        # a time alone is on the current date, every time it is parsed
+        for i in range(2):
+            today = date.today()
+            dt = entity.parse_date_time("20:30", self.hst)
+            self.assertIn(dt.date(), (today, date.today()))
+        self.assertEqual(entity.parse_date_time("", self.hst), None)
+        with self.assertRaises(ValueError):
+            entity.parse_date_time("not a date", self.hst)
 
     def test_distance_1(self):
         tgt1 = entity.StaticTarget("vega", vega[0], vega[1])
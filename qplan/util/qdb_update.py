@@ -34,9 +34,8 @@ def update_programs(qa, programsFile, logger):
         raise e
 
     try:
-        for key, pgm in programsFile.programs_info.items():
-            logger.info(f"adding record for program {key}")
-            qt.put(pgm)
+        qt.put_many(programsFile.programs_info.values())
+        logger.info(f"added records for {len(programsFile.programs_info)} programs")
     except Exception as e:
         logger.error(f'Unexpected error while updating program table in queue db:  {str(e)}', exc_info=True)
         raise e
@@ -55,9 +54,8 @@ def update_ob(qa, inst_name, ob_qf_dict, logger):
                 obs_info = pf.obs_info
             elif inst_name == 'HSC':
                 obs_info = pf.cfg['ob'].obs_info
-            for ob in obs_info:
-                logger.info(f"adding record for program {pgmName} OB {ob}")
-                qt.put(ob)
+            qt.put_many(obs_info)
+            logger.info(f"added records for program {pgmName}: {len(obs_info)} OBs")
     except Exception as e:
         logger.error(f'Unexpected error while updating ob table in queue db: {str(e)}', exc_info=True)
         raise e